@@ -27,7 +27,7 @@ class AbstractAlgorithm:
         profit.
 
         Arguments:
-        instance : pd.Series
+        instance : np.ndarray or pd.Series
             - array of time-series prices, for example, one week of BTC prices
 
         Returns: result (dictionary)
@@ -25,7 +25,7 @@ class OneMaxSearchAlgorithm(AbstractAlgorithm):
         profit.
 
         Arguments:
-        instance : pd.Series
+        instance : np.ndarray or pd.Series
             - array of time-series prices, for example, one week of BTC prices
 
         Returns: result (dictionary)
@@ -34,21 +34,23 @@ class OneMaxSearchAlgorithm(AbstractAlgorithm):
         - result['profit'] : profit generated by the algorithm
         """        
         allocation_idx = -1
-        # iterate over exchange rate in the time-series data
-        for i in range(len(instance)):
-            if self.predictor is not None:
-                prediction = self.predictor.predict(instance)
-                reservation_price = self.threshold(self.w, prediction)
-            else:
-                # prediction will not be used in threshold calculation
-                reservation_price = self.threshold(self.w, np.NINF)
-
-            # allocate if instance is greater than reservation price
-            #  and resource utilization is still zero
-            if instance[i] >= reservation_price and self.w <= 1e-5:
-                allocation_idx = i
-                self.w = 1.0 # all resources are utilized
-                break # allocation is only oneshot - we are done
+        # the prediction and resource utilization do not change until the
+        # one-shot allocation, so the reservation price is computed once
+        if self.predictor is not None:
+            prediction = self.predictor.predict(instance)
+            reservation_price = self.threshold(self.w, prediction)
+        else:
+            # prediction will not be used in threshold calculation
+            reservation_price = self.threshold(self.w, -np.inf)
+
+        # index the raw prices rather than going through pandas per element
+        prices = np.asarray(instance)
+        # allocate the first time the price is at least the reservation price
+        #  and resource utilization is still zero
+        above = prices >= reservation_price
+        if self.w <= 1e-5 and above.any():
+            allocation_idx = int(above.argmax())
+            self.w = 1.0 # all resources are utilized
 
         # if nothing is allocated as in the paper, we are stuck with
         #  the last price, where allocation_idx is -1
@@ -57,6 +59,8 @@ class OneMaxSearchAlgorithm(AbstractAlgorithm):
 
         result = {}
         result['allocation'] = allocation
-        result['profit'] = np.sum(instance * allocation) - instance[0]
+        # only one time step is traded, so skip the dot product over the
+        # whole instance
+        result['profit'] = prices[allocation_idx] - prices[0]
 
         return result
@@ -1,7 +1,53 @@
 from . import AbstractAlgorithm, OWTThresholdFunction
+from .threshold_functions.owt_threshold_function import threshold_eval, threshold_inverse
 
 import numpy as np
-from scipy.optimize import fsolve
+from joblib import Parallel, delayed
+from numba import njit
+
+
+# not cached on disk: numba does not invalidate a cached function when the
+# functions it calls from another module change
+@njit(fastmath=True)
+def _allocate_kernel(instance, w, pieces):
+    """
+    Compiled allocation loop of one-way-trading over an array of prices, using
+    the threshold tabulated by OWTThresholdFunction.pieces. Returns the
+    allocation at each time step and the resulting resource utilization.
+    """
+    allocation = np.zeros(shape=(len(instance),), dtype=np.float32)
+    # price above which all remaining resources are exchanged
+    upper_thresh = threshold_eval(1.0, pieces)
+    # w only grows when something is allocated, so the reservation price is
+    # only recomputed then
+    reservation_price = threshold_eval(w, pieces)
+    # iterate over exchange rate in the time-series data
+    for i in range(len(instance)):
+        if instance[i] < reservation_price:
+            xn = 0.0
+        elif instance[i] >= reservation_price and instance[i] < upper_thresh:
+            # invert the threshold in closed form to find the utilization
+            # whose reservation price matches the current price
+            xn = threshold_inverse(instance[i], pieces) - w
+
+            # if proposed allocation is less than 0, set xn to 0
+            if xn < 0:
+                xn = 0.0
+
+            # if proposed allocation exceeds the remaining resources, allocate the remaining amount
+            if xn > 1 - w:
+                xn = 1 - w
+        else:
+            xn = 1 - w
+        # update allocation at ith timestep and the total resources allocated
+        allocation[i] = xn
+        w += xn
+        if w >= 1:
+            # break if all the resources have been allocated
+            break
+        if xn > 0:
+            reservation_price = threshold_eval(w, pieces)
+    return allocation, w
 
 class OneWayTradingAlgorithm(AbstractAlgorithm):
     def __init__(self, L, U, lmbda, seen_instances = [], predictor=None):
@@ -26,52 +72,85 @@ class OneWayTradingAlgorithm(AbstractAlgorithm):
         Runs algorithm on an instance of data, allocating resources to maximize
         profit.
         Arguments:
-        instance : pd.Series
+        instance : np.ndarray or pd.Series
             - array of time-series prices, for example, one week of BTC prices
         Returns: result (dictionary)
         - result['allocation'] : list showing allocation at each time step, should
             sum up to 1.0, the total amount allowed to be allocated
         - result['profit'] : profit generated by the algorithm
         """
-        allocation = np.zeros(shape=(len(instance),), dtype=np.float32)
-        # iterate over exchange rate in the time-series data
-        for i in range(len(instance)):
-            if self.predictor is not None:
-                prediction = self.predictor.predict(self.seen_instances)
-            else:
-                # prediction will not be used in threshold calculation
-                prediction = None
-            reservation_price = self.threshold(self.w, prediction)
-
-            if instance[i] < reservation_price:
-                xn = 0
-            elif instance[i] >= reservation_price and instance[i] < self.threshold(1, prediction):
-                def func(x):
-                    return self.threshold(self.w+x, prediction) - instance[i]
-                xn = fsolve(func, [0.5])[0]
-
-                # if proposed allocation is less than 0, set xn to 0
-                if xn < 0:
-                    xn = 0
-
-                # if proposed allocation exceeds the remaining resources, allocate the remaining amount
-                if xn > 1 - self.w:
-                    xn = 1 - self.w
-            else:
-                xn = 1 - self.w
-            # update allocation at ith timestep and the total resources allocated
-            allocation[i] = xn
-            self.w += xn
-            if self.w >= 1:
-                # break if all the resources have been allocated
-                break
+        prices = np.ascontiguousarray(instance, dtype=np.float64)
+        if self.predictor is None:
+            allocation = self._allocate_no_pred(prices)
+        else:
+            # the predictor only sees previous instances, so the threshold is
+            # fixed for the whole instance and can be tabulated once
+            prediction = self.predictor.predict(self.seen_instances)
+            pieces = self.threshold.pieces(prediction)
+            allocation, self.w = _allocate_kernel(prices, self.w, pieces)
+
         # if there are remaining resources, exchange the remaining
         # resources at the last price
-        if self.w <= 1:
-            allocation[-1] += 1 - self.w
+        allocation[-1] += max(0.0, 1 - self.w)
 
         result = {}
         result['allocation'] = allocation
-        result['profit'] = np.sum(instance * allocation)
+        # profit is measured against the first price, as in the other algorithms
+        result['profit'] = float(prices @ allocation) - prices[0]
+
+        return result
+
+    def _allocate_no_pred(self, prices):
+        """
+        Allocation without a predictor (lmbda == 1.0), where the threshold
+        L + (alpha * L - L) * exp(alpha * w) depends on w alone. Each price
+        targets the utilization at which it equals the threshold, and the
+        utilization after each time step is the running maximum of these
+        targets, so the whole loop reduces to a few array operations.
+        Arguments:
+        prices (np.ndarray) - array of time-series prices
+        Returns:
+        allocation (np.ndarray) - allocation at each time step
+        """
+        t = self.threshold
+        # prices at or below L give no allocation
+        with np.errstate(divide='ignore', invalid='ignore'):
+            w_target = np.log((prices - t.L) / (t.alpha * t.L - t.L)) / t.alpha
+        w_target = np.nan_to_num(w_target, nan=0.0, neginf=0.0)
+        w_cummax = np.maximum.accumulate(np.maximum(np.clip(w_target, 0.0, 1.0), self.w))
+
+        allocation = np.diff(w_cummax, prepend=self.w).astype(np.float32)
+        self.w = float(w_cummax[-1])
+        return allocation
+
+
+def _allocate_stateless(L, U, lmbda, instance, seen_instances=[], predictor=None):
+    """
+    Runs one-way-trading on a single instance starting from zero resource
+    utilization, so that instances can be allocated independently of each
+    other, for example in separate worker processes.
+    """
+    alg = OneWayTradingAlgorithm(L, U, lmbda, seen_instances, predictor)
+    return alg.allocate(instance)
+
+
+def run_all(alg, instances, n_jobs=-1):
+    """
+    Runs the one-way-trading configuration of `alg` on every instance, each
+    starting from zero resource utilization, in parallel across instances.
+    `alg` itself is not modified.
+
+    Arguments:
+    alg (OneWayTradingAlgorithm) - algorithm whose bounds, lambda, seen
+        instances and predictor are used for every instance
+    instances (iterable) - instances of time-series prices, for example the
+        weeks yielded by BTCDataLoader
+    n_jobs (int) - number of worker processes, -1 for all cores
 
-        return result
\ No newline at end of file
+    Returns: results (list)
+    - result dictionary returned by `allocate` for each instance, in order
+    """
+    t = alg.threshold
+    return Parallel(n_jobs=n_jobs, batch_size=8)(
+        delayed(_allocate_stateless)(t.L, t.U, t.lmbda, instance, alg.seen_instances, alg.predictor)
+        for instance in instances)
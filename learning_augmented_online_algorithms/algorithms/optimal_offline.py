@@ -16,7 +16,7 @@ class OptimalOfflineAlgorithm(AbstractAlgorithm):
         profit.
 
         Arguments:
-        instance : pd.Series
+        instance : np.ndarray or pd.Series
             - array of time-series prices, for example, one week of BTC prices
 
         Returns: result (dictionary)
@@ -25,14 +25,16 @@ class OptimalOfflineAlgorithm(AbstractAlgorithm):
         - result['profit'] : profit generated by the algorithm
         """
         result = {}
+        # index the raw prices rather than going through pandas per element
+        prices = np.asarray(instance)
 
-        allocation = np.zeros(shape=(len(instance),), dtype=np.float32)
+        allocation = np.zeros(shape=(len(prices),), dtype=np.float32)
         # allocate when the price is maximum
-        argmax = instance.argmax()
+        argmax = prices.argmax()
         allocation[argmax] = 1.0
         result['allocation'] = allocation
 
         # profit is the highest price
-        result['profit'] = instance[argmax] - instance[0]
+        result['profit'] = prices[argmax] - prices[0]
 
         return result
@@ -4,6 +4,45 @@ import numpy as np
 import scipy.integrate as integrate
 from scipy.special import lambertw
 from scipy.optimize import fsolve
+from numba import njit
+
+
+@njit(cache=True, fastmath=True)
+def threshold_eval(w, pieces):
+    """
+    Evaluate a piecewise threshold function at resource utilization w. Each row
+    (start, end, closed, base, scale, rate, origin, low, high) of `pieces` is
+    the threshold base + scale * exp(rate * (w - origin)) for w from start up
+    to end, including end when closed is 1.0, and the last row covers every w
+    past the earlier pieces.
+    """
+    k = 0
+    while k < pieces.shape[0] - 1 and (w > pieces[k, 1] or (w == pieces[k, 1] and pieces[k, 2] == 0.0)):
+        k += 1
+    return pieces[k, 3] + pieces[k, 4] * np.exp(pieces[k, 5] * (w - pieces[k, 6]))
+
+
+@njit(cache=True, fastmath=True)
+def threshold_inverse(price, pieces):
+    """
+    Largest resource utilization w in [0, 1] whose reservation price, given by
+    the piecewise threshold in `pieces`, does not exceed `price`. Each piece is
+    either constant or exponential in w, so it is inverted in closed form, and
+    its tabulated low and high thresholds avoid evaluating exp.
+    """
+    for k in range(pieces.shape[0]):
+        start, end = max(pieces[k, 0], 0.0), min(pieces[k, 1], 1.0)
+        if end <= start:
+            continue
+        # threshold jumps above the price at the start of this piece
+        if price < pieces[k, 7]:
+            return start
+        # price falls inside this piece, invert the exponential
+        if pieces[k, 5] > 0 and price < pieces[k, 8]:
+            base, scale, rate, origin = pieces[k, 3], pieces[k, 4], pieces[k, 5], pieces[k, 6]
+            return origin + np.log((price - base) / scale) / rate
+    return 1.0
+
 
 class OWTThresholdFunction(AbstractThresholdFunction):
     """
@@ -38,16 +77,17 @@ class OWTThresholdFunction(AbstractThresholdFunction):
         reservation price (float): when price exceeds reservation price in
             one-max-search, a trade is executed.
         """
-        if pred is None and self.lmbda < 1.0:
-            raise TypeError("cannot use threshold function with "
-                            "lmbda < 1.0 when there is no prediction")
-        elif pred is None:
-            # Default to pure online algorithm
-            return self.L + (self.alpha * self.L - self.L) * np.exp(self.alpha * w)
-        # clip if prediction is out of bounds
-        pred = np.clip(pred, self.L, self.U)
+        return threshold_eval(w, self.pieces(pred))
 
-        # pred now bounded between L and U
+    def _breakpoints(self, pred):
+        """
+        Solve for the bounds used in the piecewise threshold function given a
+        prediction already clipped to [L, U].
+        Arguments:
+        pred (float) - prediction of the price of the next time step.
+        Returns:
+        (M, B, M1, B1, B1_, B2) - price and utilization bounds of each piece.
+        """
         # we now solve for the bounds used in the piecewise function for computing the threshold
         # solve for M and B
         def eq1(x):
@@ -63,18 +103,65 @@ class OWTThresholdFunction(AbstractThresholdFunction):
                     np.real(x[3] - 1 - 1 / self.gamma * np.log((min(pred * self.gamma / self.eta, self.U) - self.L) / (self.U - self.L)))]
         M1, B1, B1_, B2 = fsolve(eq2, [20000,0.5,0.5,0.5])
 
-        # compute threshold using M, B, M1, B1, B1_, and B2
-        if pred >= self.L and pred < M:
-            if w >= 0 and w < B:
-                return self.L + (self.eta * self.L - self.L) * np.exp(self.eta * w)
-            else:
-                return self.L + (self.U - self.L) * np.exp(self.gamma * (w - 1))
+        return M, B, M1, B1, B1_, B2
+
+    def pieces(self, pred):
+        """
+        Tabulate the threshold function for a given prediction as rows of
+        (start, end, closed, base, scale, rate, origin, low, high), so that it
+        can be evaluated and inverted by the compiled `threshold_eval` and
+        `threshold_inverse`. closed is 1.0 when the piece includes its end, and
+        low and high are the thresholds at the start and end of each piece
+        within [0, 1].
+        Arguments:
+        pred (float) - prediction of the price of the next time step, which may
+            come from an ML model.
+        Returns:
+        pieces (np.ndarray) - float64 array of shape (number of pieces, 9).
+        """
+        if pred is None and self.lmbda < 1.0:
+            raise TypeError("cannot use threshold function with "
+                            "lmbda < 1.0 when there is no prediction")
+        elif pred is None:
+            # Default to pure online algorithm
+            pieces = [(0.0, 1.0, 0.0, self.L, self.alpha * self.L - self.L, self.alpha, 0.0)]
         else:
-            if w >= 0 and w < B1:
-                return self.L + (self.gamma * self.L - self.L) * np.exp(self.gamma * w)
-            elif w >= B1 and w < B1_:
-                return M1
-            elif w >= B1_ and w <= B2:
-                return self.L + (M1 - self.L) * np.exp(self.eta * (w - B1_))
+            # clip if prediction is out of bounds
+            pred = np.clip(pred, self.L, self.U)
+
+            # compute threshold using M, B, M1, B1, B1_, and B2
+            M, B, M1, B1, B1_, B2 = self._breakpoints(pred)
+            if pred >= self.L and pred < M:
+                pieces = [(0.0, B, 0.0, self.L, self.eta * self.L - self.L, self.eta, 0.0),
+                          (B, 1.0, 0.0, self.L, self.U - self.L, self.gamma, 1.0)]
             else:
-                return self.L + (self.U - self.L) * np.exp(self.gamma * (w - 1))
\ No newline at end of file
+                # the third piece includes B2, as in the piecewise definition
+                pieces = [(0.0, B1, 0.0, self.L, self.gamma * self.L - self.L, self.gamma, 0.0),
+                          (B1, B1_, 0.0, M1, 0.0, 0.0, 0.0),
+                          (B1_, B2, 1.0, self.L, M1 - self.L, self.eta, B1_),
+                          (B2, 1.0, 0.0, self.L, self.U - self.L, self.gamma, 1.0)]
+        pieces = np.array(pieces, dtype=np.float64)
+
+        # thresholds at both ends of each piece, computed once per prediction
+        start, end = np.clip(pieces[:, 0], 0.0, 1.0), np.clip(pieces[:, 1], 0.0, 1.0)
+        base, scale, rate, origin = pieces[:, 3:7].T
+        with np.errstate(over='ignore'):
+            low = base + scale * np.exp(rate * (start - origin))
+            high = base + scale * np.exp(rate * (end - origin))
+        return np.column_stack([pieces, low, high])
+
+    def inverse(self, price, pred):
+        """
+        Inverse of the threshold function: the largest resource utilization w
+        whose reservation price does not exceed `price`. Each piece of the
+        threshold is either constant or exponential in w, so the inverse is
+        computed in closed form rather than with a root finder.
+        Arguments:
+        price (float) - current exchange rate.
+        pred (float) - prediction of the price of the next time step, which may
+            come from an ML model.
+        Returns:
+        w (float) - number between 0.0 to 1.0 denoting the fraction of resources
+            that should be used at this price.
+        """
+        return threshold_inverse(price, self.pieces(pred))
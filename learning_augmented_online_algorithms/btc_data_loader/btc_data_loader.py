@@ -3,17 +3,21 @@ Module for loading BTC data from csv files.
 """
 from __future__ import annotations
 
+import os
+import tempfile
 from datetime import datetime, timedelta
+from joblib import Parallel, delayed
+import numpy as np
 import pandas as pd
 
 
 BASE_URL = 'https://raw.githubusercontent.com/jrrhuang/data/main/BTCUSD/'
 DT_FORMAT = '%Y-%m-%d'
-DATA_PATHS = []
-for year in range(2022, 2014, -1):
-    DATA_PATHS.append(BASE_URL + f'gemini_BTCUSD_{year}_1min.csv')
+DATA_PATHS = tuple(BASE_URL + f'gemini_BTCUSD_{year}_1min.csv'
+                   for year in range(2022, 2014, -1))
 START_DATE_2015 = datetime.strptime('2015-10-08', DT_FORMAT)
 END_DATE_2022 = datetime.strptime('2022-03-20', DT_FORMAT)
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'btc_data.parquet')
 
 
 class BTCDataLoader:
@@ -21,11 +25,13 @@ class BTCDataLoader:
     Iterator for BTCData.
 
     Interface for loading Bitcoin data sequentially from csv files. Loads
-    one-week of data starting on the Monday of each week.
+    one-week of close prices starting on the Sunday of each week, as an
+    np.ndarray view of the data. Timestamps are kept in `df`.
     """
 
     def __init__(self, start_date_str: str = '2015-10-07',
-                 end_date_str: str = None, interval: int = 5) -> None:
+                 end_date_str: str = None, interval: int = 5,
+                 cache_path: str = CACHE_PATH) -> None:
         """
         Initialize BTCDaetaLoader iterator object.
 
@@ -33,6 +39,8 @@ class BTCDataLoader:
         start_date_str (str) - start date of BTC data trace
         end_date_str (str) - end date of BTC data trace
         interval (int) - number of minutes per timestep
+        cache_path (str) - parquet file caching the parsed csv files, or None
+            to always load from the csv files
 
         Notes:
         Both `start_date_str` and `end_date_str` should be in YYYY-MM-DD format
@@ -56,33 +64,60 @@ class BTCDataLoader:
         self.end_date = end_date + timedelta(days=1)
 
         # load in data
-        start_date_str = self.start_date.strftime(DT_FORMAT)
-        end_date_str = self.end_date.strftime(DT_FORMAT)
-        self.df = pd.concat([pd.read_csv(data, skiprows=1, parse_dates=['Date'], index_col=['Date'])
-                            for data in DATA_PATHS])['Close']
-
-        # slice from start to finish and reverse direction
-        self.df = self.df.sort_index().loc[start_date_str: end_date_str]
+        if cache_path is not None and os.path.exists(cache_path):
+            # caches written before prices were stored as float32 hold float64
+            df = pd.read_parquet(cache_path)['Close'].astype(np.float32, copy=False)
+        else:
+            # yearly files are independent, so parse them in parallel; only the
+            # close price is used, so skip parsing the other columns, and
+            # float32 is precise enough for prices while halving memory
+            dfs = Parallel(n_jobs=min(8, len(DATA_PATHS)), prefer='threads')(
+                delayed(pd.read_csv)(data, skiprows=1, usecols=['Date', 'Close'],
+                                     dtype={'Close': np.float32},
+                                     parse_dates=['Date'], index_col=['Date'])
+                for data in DATA_PATHS)
+            df = pd.concat(dfs)['Close'].sort_index()
+            # cache the full trace so later loads skip downloading and parsing;
+            # write to a temporary file and move it into place, so loaders
+            # running concurrently never read a half-written cache
+            if cache_path is not None:
+                cache_dir = os.path.dirname(cache_path)
+                os.makedirs(cache_dir, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.parquet.tmp')
+                os.close(fd)
+                try:
+                    df.to_frame().to_parquet(tmp_path, compression='zstd')
+                    os.replace(tmp_path, cache_path)
+                except BaseException:
+                    os.remove(tmp_path)
+                    raise
+
+        # slice from start to the end of the cutoff day
+        start, end = df.index.searchsorted([self.start_date, self.end_date + timedelta(days=1)])
+        self.df = df.iloc[start: end]
+        # weeks are yielded as views of the raw prices, without pandas overhead
+        self.prices = self.df.to_numpy()
 
         # store interval of each timestep
         self.interval = interval
 
     def __iter__(self):
         """Iterate through data by week."""
-        self.curweek = self.start_date
-        self.nextweek = self.curweek + timedelta(days=6)
+        # a week runs from the start of Sunday up to, but excluding, the next
+        # Sunday, and only complete weeks before the end date are used
+        n_weeks = max(((self.end_date - self.start_date).days - 6) // 7 + 1, 0)
+        week_starts = pd.date_range(self.start_date, periods=n_weeks + 1, freq='7D')
+        # integer position of each week boundary in the data
+        self.positions = self.df.index.searchsorted(week_starts)
+        self.week = 0
         return self
 
     def __next__(self):
-        """Get next week's data until end of data set."""
-        if self.nextweek > self.end_date:
+        """Get next week's prices as an np.ndarray until end of data set."""
+        if self.week >= len(self.positions) - 1:
             raise StopIteration
 
-        curweekstr = self.curweek.strftime(DT_FORMAT)
-        nextweekstr = self.nextweek.strftime(DT_FORMAT)
-        data = self.df.loc[curweekstr: nextweekstr]
-
-        self.curweek = self.curweek + timedelta(days=7)
-        self.nextweek = self.nextweek + timedelta(days=7)
+        data = self.prices[self.positions[self.week]: self.positions[self.week + 1]]
+        self.week += 1
 
         return data[::self.interval]
@@ -28,6 +28,9 @@ setuptools.setup(
     install_requires=[
         "datetime",
         "pandas",
-        "numpy"
+        "numpy",
+        "numba",
+        "joblib",
+        "pyarrow"
     ],
 )
\ No newline at end of file
@@ -1,8 +1,72 @@
-# just tests that one-max-search and optimal-offline-algorithm work as expected
+# just tests that one-max-search, one-way-trading and optimal-offline-algorithm work as expected
 
 from learning_augmented_online_algorithms import BTCDataLoader
 from learning_augmented_online_algorithms.algorithms import OneMaxSearchAlgorithm, OneWayTradingAlgorithm, OptimalOfflineAlgorithm
 from learning_augmented_online_algorithms.algorithms.predictors import SimplePredictor
+from learning_augmented_online_algorithms.algorithms.threshold_functions import OWTThresholdFunction
+from learning_augmented_online_algorithms.algorithms.threshold_functions.owt_threshold_function import threshold_eval, threshold_inverse
+from learning_augmented_online_algorithms.algorithms.one_way_trading import _allocate_kernel
+
+import numpy as np
+
+
+def piecewise_owt_threshold(threshold, w, pred, breakpoints):
+    """one-way-trading threshold written out piece by piece from its breakpoints"""
+    L, U = threshold.L, threshold.U
+    pred = np.clip(pred, L, U)
+    M, B, M1, B1, B1_, B2 = breakpoints
+    if pred >= L and pred < M:
+        if w >= 0 and w < B:
+            return L + (threshold.eta * L - L) * np.exp(threshold.eta * w)
+        return L + (U - L) * np.exp(threshold.gamma * (w - 1))
+    if w >= 0 and w < B1:
+        return L + (threshold.gamma * L - L) * np.exp(threshold.gamma * w)
+    elif w >= B1 and w < B1_:
+        return M1
+    elif w >= B1_ and w <= B2:
+        return L + (M1 - L) * np.exp(threshold.eta * (w - B1_))
+    return L + (U - L) * np.exp(threshold.gamma * (w - 1))
+
+
+# the tabulated threshold should agree with the piecewise definition at its
+# breakpoints, where each piece is closed or open; breakpoints and pieces are
+# solved once per prediction
+for L, U in [(813, 928), (1000, 1300), (400, 460), (9000, 12000)]:
+    for lmbda in [0.25, 0.5, 0.75]:
+        owt_threshold = OWTThresholdFunction(L, U, lmbda)
+        for pred in np.linspace(L, U, 5):
+            breakpoints = owt_threshold._breakpoints(pred)
+            pieces = owt_threshold.pieces(pred)
+            M, B, M1, B1, B1_, B2 = breakpoints
+            for w in [B, B1, B1_, B2, 1.0]:
+                if 0.0 <= w <= 1.0:
+                    assert np.isclose(threshold_eval(w, pieces),
+                                      piecewise_owt_threshold(owt_threshold, w, pred, breakpoints))
+
+# inverting the threshold at a price inside an exponential piece should give
+# back that price, wherever the threshold is non-decreasing in w
+for L, U in [(813, 928), (1000, 1300), (400, 460), (9000, 12000)]:
+    for lmbda in [0.25, 0.5, 0.75, 1.0]:
+        owt_threshold = OWTThresholdFunction(L, U, lmbda)
+        for pred in [None] if lmbda == 1.0 else np.linspace(L, U, 5):
+            pieces = owt_threshold.pieces(pred)
+            if np.any(np.diff([threshold_eval(w, pieces) for w in np.linspace(0, 1, 201)]) < 0):
+                continue
+            for start, end, _, _, _, rate, *_ in pieces:
+                start, end = max(start, 0.0), min(end, 1.0)
+                if rate > 0 and end - start > 1e-6:
+                    price = threshold_eval((start + end) / 2, pieces)
+                    assert np.isclose(threshold_eval(threshold_inverse(price, pieces), pieces), price)
+
+# the vectorized allocation without a predictor should match the compiled loop
+rng = np.random.default_rng(0)
+for _ in range(20):
+    prices = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 2016)))
+    L, U = 0.98 * prices.min(), rng.choice([0.9, 1.02]) * prices.max()
+    owt = OneWayTradingAlgorithm(L, U, lmbda=1.0)
+    allocation, w = _allocate_kernel(prices, 0.0, owt.threshold.pieces(None))
+    assert np.allclose(owt._allocate_no_pred(prices), allocation, atol=1e-6)
+    assert np.isclose(owt.w, w)
 
 print("Loading BTC data...")
 dl = BTCDataLoader()
@@ -23,25 +87,26 @@ for week_data in iter(dl):
     theta = U / L
     thetas.append(theta)
     oms3 = OneMaxSearchAlgorithm(L, U, lmbda=1.0, predictor=None)
-    # owt = OneWayTradingAlgorithm(L, U, lmbda=1.0, predictor=SimplePredictor(L, U))
+    owt = OneWayTradingAlgorithm(L, U, lmbda=1.0, predictor=SimplePredictor(L, U))
 
     res3 = oms3.allocate(week_data)
-    # res4 = owt.allocate(week_data)
-    res4 = {"profit": 0}
+    res4 = owt.allocate(week_data)
     res5 = ooa.allocate(week_data)
 
     # total allocation should be 1.0
     assert sum(res3['allocation']) == 1.0
-    # assert sum(res4['allocation']) == 1.0
+    assert np.isclose(sum(res4['allocation']), 1.0)
     assert sum(res5['allocation']) == 1.0
     # calculate profits
     print("profits -- oms: ", res3['profit'], ", owt: ", res4['profit'], ", ooa: ", res5['profit'])
 
     # cumulative profits
     cum_profit_oms.append(res3['profit'])
+    cum_profit_owt.append(res4['profit'])
     cum_profit_ooa.append(res5['profit'])
 
     prev_data.append(week_data)
 print(" --- done ---")
 print("profit ratio of oms: ", sum(cum_profit_oms) / sum(cum_profit_ooa))
+print("profit ratio of owt: ", sum(cum_profit_owt) / sum(cum_profit_ooa))
 print("average theta: ", sum(thetas) / len(thetas))